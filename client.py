@@ -1,5 +1,12 @@
 import asyncio
 
+try:
+    import uvloop
+
+    _run = uvloop.run
+except ImportError:  # Windows など uvloop が無い環境では標準のイベントループ
+    _run = asyncio.run
+
 from mcp import ClientSession
 from mcp.client.stdio import StdioServerParameters, stdio_client
 
@@ -29,7 +36,7 @@ async def amain() -> None:
 
 
 def main() -> None:
-    asyncio.run(amain())
+    _run(amain())
 
 
 if __name__ == "__main__":
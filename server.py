@@ -4,14 +4,15 @@ server = FastMCP(name="mcp-sample-server")
 
 
 @server.tool()
-async def echo(text: str) -> str:
+def echo(text: str) -> str:
     """与えられた文字列をそのまま返します。"""
     return text
 
 
 @server.tool()
-async def add(a: float, b: float) -> float:
+def add(a: int | float, b: int | float) -> int | float:
     """2つの数値を加算して返します。"""
+    # int | float にしておくと整数の入力は float に変換されず、整数のまま加算される
     return a + b
 
 
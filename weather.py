@@ -1,42 +1,261 @@
 import asyncio
+import re
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager
+from io import StringIO
 from typing import Any
 
 import httpx
-from mcp.server.fastmcp import FastMCP
+import ijson
+import msgspec
+from jinja2 import Environment
 
-# Initialize FastMCP server
-mcp = FastMCP("weather")
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で代用する
+    import json as orjson
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+from mcp.server.fastmcp import FastMCP
 
 # Constants
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "weather-app/1.0"
 
+# ツール呼び出しごとに TCP/TLS 接続を張り直さないよう、クライアントを共有する。
+# 呼び出しの間隔が空いても接続を使い回せるよう keepalive_expiry を延ばし、
+# 接続失敗は transport の retries で吸収する。
+_client: httpx.AsyncClient | None = None
+# lifespan はセッションごとに入るので、最後のセッションが終わるまで閉じない
+_active_sessions = 0
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it if needed."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept": "application/geo+json",
+                # JSON はよく圧縮が効くので brotli/gzip を要求する(展開は httpx が行う)
+                "Accept-Encoding": "br, gzip",
+            },
+            timeout=httpx.Timeout(30.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=100,
+                    keepalive_expiry=60.0,
+                ),
+            ),
+        )
+    return _client
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Close the shared HTTP client when the last active session ends."""
+    global _client, _active_sessions
+    _active_sessions += 1
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0 and _client is not None:
+            client, _client = _client, None
+            await client.aclose()
+
+
+# Initialize FastMCP server
+mcp = FastMCP("weather", lifespan=lifespan)
+
+# キャッシュの有効期限(秒)
+# /points の結果(グリッド -> 予報URL)はほぼ変わらないので長めにする
+FORECAST_URL_TTL = 24 * 60 * 60.0
+ALERTS_TTL = 30.0
+TOKYO_WEATHER_TTL = 60.0
+HOURLY_FORECAST_TTL = 10 * 60.0
+# 取得に失敗したときは TTL のこの倍数までは古い値を返す
+STALE_FACTOR = 10
+# 座標ごとにキーが増えるので、古い(最近使われていない)ものから捨てる
+CACHE_MAX_ENTRIES = 1024
+
+_cache: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+_cache_locks: dict[str, asyncio.Lock] = {}
+
+# JMA のレスポンスは一部のキーしか参照しないため、simdjson があれば遅延パースする。
+# Parser は再利用できるが、保持できるドキュメントは同時に1つだけ。
+_jma_parser = simdjson.Parser() if simdjson else None
+# 長い名前を先に並べ、東京地方 が 東京 より優先して一致するようにする
+TOKYO_AREA_PATTERN = re.compile("東京地方|東京|Tokyo")
+
+
+class Period(msgspec.Struct):
+    """A single period of an NWS forecast; unused fields are skipped."""
+
+    name: str
+    startTime: str
+    temperature: int | float
+    temperatureUnit: str
+    windSpeed: str
+    windDirection: str
+    shortForecast: str
+    detailedForecast: str
+
+
+class ForecastProperties(msgspec.Struct):
+    periods: list[Period]
+
+
+class Forecast(msgspec.Struct):
+    properties: ForecastProperties
+
+
+_forecast_decoder = msgspec.json.Decoder(Forecast)
+
+
+async def fetch_nws_bytes(url: str) -> bytes | None:
+    """Fetch the raw body of an NWS API response with proper error handling."""
+    try:
+        response = await get_client().get(url)
+        response.raise_for_status()
+        return response.content
+    except Exception:
+        return None
+
 
 async def make_nws_request(url: str) -> dict[str, Any] | None:
     """Make a request to the NWS API with proper error handling."""
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/geo+json"
-    }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
+    body = await fetch_nws_bytes(url)
+    try:
+        return orjson.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def get_nws_forecast(url: str) -> Forecast | None:
+    """Fetch an NWS forecast (or hourly forecast) decoded into a Forecast."""
+    body = await fetch_nws_bytes(url)
+    try:
+        return _forecast_decoder.decode(body) if body else None
+    except msgspec.MsgspecError:
+        return None
+
+
+async def _cached[T](
+    key: str, ttl: float, fetch: Callable[[], Awaitable[T | None]]
+) -> T | None:
+    """Return the result of fetch() through a small in-memory TTL cache.
+
+    Concurrent misses for the same key share a single fetch. If the fetch
+    fails (returns None or raises), a stale value younger than
+    ttl * STALE_FACTOR is returned instead.
+    """
+    value = _cache_get(key, ttl)
+    if value is not None:
+        return value
+
+    try:
+        async with _cache_locks.setdefault(key, asyncio.Lock()):
+            # 待っている間に別の呼び出しが取得済みかもしれない
+            value = _cache_get(key, ttl)
+            if value is not None:
+                return value
+
+            try:
+                value = await fetch()
+            except Exception:
+                value = None
+
+            if value is None:
+                return _cache_get(key, ttl * STALE_FACTOR)
+
+            _cache_set(key, value)
+            return value
+    finally:
+        if len(_cache_locks) > CACHE_MAX_ENTRIES:
+            _prune_cache_locks()
+
+
+def _cache_get(key: str, ttl: float) -> Any | None:
+    entry = _cache.get(key)
+    if entry and time.monotonic() - entry[0] < ttl:
+        _cache.move_to_end(key)
+        return entry[1]
+    return None
+
+
+def _cache_set(key: str, value: Any) -> None:
+    _cache[key] = (time.monotonic(), value)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+
+def _prune_cache_locks() -> None:
+    # 使用中でないロックは次の取得時に作り直せばよい
+    for key in [k for k, lock in _cache_locks.items() if not lock.locked()]:
+        del _cache_locks[key]
+
+
+def _location_key(latitude: float, longitude: float) -> str:
+    return f"{round(latitude, 4)},{round(longitude, 4)}"
+
+
+async def get_forecast_urls(
+    latitude: float, longitude: float
+) -> tuple[str, str] | None:
+    """Resolve the NWS (forecast, hourly forecast) URLs for a location.
+
+    The result is cached per grid point.
+    """
+    location = _location_key(latitude, longitude)
+
+    async def fetch() -> tuple[str, str] | None:
+        points_url = f"{NWS_API_BASE}/points/{location}"
+        points_data = await make_nws_request(points_url)
+        if not points_data:
             return None
+        props = points_data["properties"]
+        return props["forecast"], props["forecastHourly"]
+
+    return await _cached(f"points:{location}", FORECAST_URL_TTL, fetch)
+
 
+# 警報一覧はテンプレートを一度だけコンパイルしておき、まとめて描画する
+_ALERTS_TEMPLATE = Environment(autoescape=False).from_string(
+    "{% for p in alerts %}"
+    "{% if not loop.first %}\n---\n{% endif %}"
+    "\nEvent: {{ p.event | default('Unknown') }}"
+    "\nArea: {{ p.areaDesc | default('Unknown') }}"
+    "\nSeverity: {{ p.severity | default('Unknown') }}"
+    "\nDescription: {{ p.description | default('No description available') }}"
+    "\nInstructions: {{ p.instruction"
+    " | default('No specific instructions provided') }}\n"
+    "{% endfor %}"
+)
 
-def format_alert(feature: dict) -> str:
-    """Format an alert feature into a readable string."""
-    props = feature["properties"]
-    return f"""
-Event: {props.get('event', 'Unknown')}
-Area: {props.get('areaDesc', 'Unknown')}
-Severity: {props.get('severity', 'Unknown')}
-Description: {props.get('description', 'No description available')}
-Instructions: {props.get('instruction', 'No specific instructions provided')}
-"""
+
+class _AsyncByteReader:
+    """Expose an async byte iterator as the async file object ijson reads."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson は read(0) で bytes/str を判定するので、そこでは消費しない
+        if size == 0:
+            return b""
+        return await anext(self._chunks, b"")
 
 
 @mcp.tool()
@@ -46,110 +265,76 @@ async def get_alerts(state: str) -> str:
     Args:
         state: Two-letter US state code (e.g. CA, NY)
     """
-    url = f"{NWS_API_BASE}/alerts/active/area/{state}"
-    data = await make_nws_request(url)
+    alerts = await _cached(
+        f"alerts:{state}", ALERTS_TTL, lambda: _fetch_alerts(state)
+    )
+    return alerts or "Unable to fetch alerts or no alerts found."
+
 
-    if not data or "features" not in data:
-        return "Unable to fetch alerts or no alerts found."
+async def _fetch_alerts(state: str) -> str | None:
+    url = f"{NWS_API_BASE}/alerts/active/area/{state}"
+    # 警報の多い州ではレスポンスが数MBになるため、全体を読み込まずに
+    # features の properties だけを1件ずつパースする(geometry は組み立てない)
+    async with get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        reader = _AsyncByteReader(response.aiter_bytes(65536))
+        items = ijson.items_async(reader, "features.item.properties")
+        alerts = [props async for props in items]
 
-    if not data["features"]:
+    if not alerts:
         return "No active alerts for this state."
 
-    alerts = [format_alert(feature) for feature in data["features"]]
-    return "\n---\n".join(alerts)
+    return _ALERTS_TEMPLATE.render(alerts=alerts)
+
+
+def _iter_weathers(data: Any) -> Iterator[tuple[str, str]]:
+    """Yield (area name, first weathers entry) for each JMA forecast area."""
+    # JMAのレスポンスは配列。
+    # timeSeries -> areas[].weathers の先頭が「今日」
+    for obj in data or ():
+        for ts in obj.get("timeSeries") or ():
+            for area in ts.get("areas") or ():
+                weathers = area.get("weathers")
+                if weathers:
+                    yield area.get("area", {}).get("name", ""), weathers[0]
+
+
+def _pick_tokyo_weather(data: Any) -> str | None:
+    """Pick today's weather for Tokyo from a JMA forecast in a single pass."""
+    # フォールバック: 最初に見つかったweathersの先頭を使用
+    fallback = None
+    for area_name, weather in _iter_weathers(data):
+        if TOKYO_AREA_PATTERN.search(area_name):
+            return weather
+        if fallback is None:
+            fallback = weather
+    return fallback
 
 
 @mcp.tool()
 async def get_tokyo_weather() -> str:
     """Get weather forecast for Tokyo."""
+    weather = await _cached("tokyo", TOKYO_WEATHER_TTL, _fetch_tokyo_weather)
+    return weather or "東京の天気情報を取得できませんでした。"
+
+
+async def _fetch_tokyo_weather() -> str | None:
     # ref: https://anko.education/webapi/jma
     url = "https://www.jma.go.jp/bosai/forecast/data/forecast/130000.json"
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json",
-    }
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            data = response.json()
-
-        # JMAのレスポンスは配列。
-        # timeSeries -> areas[].weathers の先頭が「今日」
-        preferred_names = ("東京地方", "東京", "Tokyo")
-        today_weather: str | None = None
-
-        if isinstance(data, list):
-            for obj in data:
-                time_series = (
-                    obj.get("timeSeries", [])
-                    if isinstance(obj, dict)
-                    else []
-                )
-                for ts in time_series:
-                    areas = (
-                        ts.get("areas", [])
-                        if isinstance(ts, dict)
-                        else []
-                    )
-                    for area in areas:
-                        if not isinstance(area, dict):
-                            continue
-                        weathers_any = area.get("weathers")
-                        if (
-                            not isinstance(weathers_any, list)
-                            or not weathers_any
-                        ):
-                            continue
-                        weathers = weathers_any
-                        area_info = (
-                            area.get("area", {})
-                            if isinstance(area.get("area"), dict)
-                            else {}
-                        )
-                        area_name = area_info.get("name", "")
-                        if any(name in area_name for name in preferred_names):
-                            today_weather = weathers[0] if weathers else None
-                            break
-                    if today_weather:
-                        break
-                if today_weather:
-                    break
-
-        # フォールバック: 最初に見つかったweathersの先頭を使用
-        if not today_weather and isinstance(data, list):
-            for obj in data:
-                time_series = (
-                    obj.get("timeSeries", [])
-                    if isinstance(obj, dict)
-                    else []
-                )
-                for ts in time_series:
-                    areas = (
-                        ts.get("areas", [])
-                        if isinstance(ts, dict)
-                        else []
-                    )
-                    for area in areas:
-                        if isinstance(area, dict):
-                            weathers_any = area.get("weathers")
-                            if (
-                                isinstance(weathers_any, list)
-                                and weathers_any
-                            ):
-                                today_weather = weathers_any[0]
-                                break
-                            break
-                    if today_weather:
-                        break
-                if today_weather:
-                    break
-
-        if today_weather:
-            return f"東京の今日の天気: {today_weather}"
-        return "東京の天気情報を取得できませんでした。"
-    except Exception:
-        return "東京の天気情報を取得できませんでした。"
+    response = await get_client().get(
+        url, headers={"Accept": "application/json"}
+    )
+    response.raise_for_status()
+
+    if _jma_parser is not None:
+        data = _jma_parser.parse(response.content)
+    else:
+        data = orjson.loads(response.content)
+
+    today_weather = _pick_tokyo_weather(data)
+    if today_weather:
+        return f"東京の今日の天気: {today_weather}"
+    return None
 
 
 @mcp.tool()
@@ -160,33 +345,88 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         latitude: Latitude of the location
         longitude: Longitude of the location
     """
-    # First get the forecast grid endpoint
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
+    # First get the forecast grid endpoint (cached per grid point)
+    urls = await get_forecast_urls(latitude, longitude)
 
-    if not points_data:
+    if not urls:
         return "Unable to fetch forecast data for this location."
 
-    # Get the forecast URL from the points response
-    forecast_url = points_data["properties"]["forecast"]
-    forecast_data = await make_nws_request(forecast_url)
+    # 続けて時間別予報も求められることが多いので、同じ接続上で並行して先読みする
+    forecast_data, _ = await asyncio.gather(
+        get_nws_forecast(urls[0]),
+        _cached_hourly_forecast(latitude, longitude),
+    )
 
     if not forecast_data:
         return "Unable to fetch detailed forecast."
 
-    # Format the periods into a readable forecast
-    periods = forecast_data["properties"]["periods"]
-    forecasts = []
-    for period in periods[:5]:  # Only show next 5 periods
-        forecast = f"""
-{period['name']}:
-Temperature: {period['temperature']}°{period['temperatureUnit']}
-Wind: {period['windSpeed']} {period['windDirection']}
-Forecast: {period['detailedForecast']}
-"""
-        forecasts.append(forecast)
-
-    return "\n---\n".join(forecasts)
+    # Only show next 5 periods
+    return format_periods(forecast_data.properties.periods[:5])
+
+
+@mcp.tool()
+async def get_hourly_forecast(latitude: float, longitude: float) -> str:
+    """Get the hourly weather forecast for the next 12 hours at a location.
+
+    Args:
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+    """
+    forecast = await _cached_hourly_forecast(latitude, longitude)
+    return forecast or "Unable to fetch hourly forecast for this location."
+
+
+async def _cached_hourly_forecast(
+    latitude: float, longitude: float
+) -> str | None:
+    return await _cached(
+        f"hourly:{_location_key(latitude, longitude)}",
+        HOURLY_FORECAST_TTL,
+        lambda: _fetch_hourly_forecast(latitude, longitude),
+    )
+
+
+async def _fetch_hourly_forecast(
+    latitude: float, longitude: float
+) -> str | None:
+    urls = await get_forecast_urls(latitude, longitude)
+    if not urls:
+        return None
+
+    hourly_data = await get_nws_forecast(urls[1])
+    if not hourly_data:
+        return None
+
+    return format_periods(hourly_data.properties.periods[:12])
+
+
+_PERIOD_TEMPLATE = """
+{}:
+Temperature: {}°{}
+Wind: {} {}
+Forecast: {}
+""".format
+
+
+def format_periods(periods: list[Period]) -> str:
+    """Format forecast periods into a readable forecast."""
+    # 時間別予報の period は name と detailedForecast が空なので
+    # 開始時刻と shortForecast で代用する
+    buf = StringIO()
+    for i, p in enumerate(periods):
+        if i:
+            buf.write("\n---\n")
+        buf.write(
+            _PERIOD_TEMPLATE(
+                p.name or p.startTime,
+                p.temperature,
+                p.temperatureUnit,
+                p.windSpeed,
+                p.windDirection,
+                p.detailedForecast or p.shortForecast,
+            )
+        )
+    return buf.getvalue()
 
 
 async def main():